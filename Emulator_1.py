@@ -1,20 +1,29 @@
 import tkinter as tk
 from tkinter import ttk
+import functools
 import getpass
 import socket
 import shlex
 import sys
 
 
+@functools.lru_cache(maxsize=1)
+def _cached_user() -> str:
+    return getpass.getuser() or "user"
+
+
+@functools.lru_cache(maxsize=1)
+def _cached_host() -> str:
+    try:
+        return socket.gethostname() or "host"
+    except Exception:
+        return "host"
+
+
 class ShellEmulatorGUI:
     def __init__(self, root: tk.Tk):
         self.root = root
-        user = getpass.getuser() or "user"
-        try:
-            host = socket.gethostname() or "host"
-        except Exception:
-            host = "host"
-        self.user, self.host = user, host
+        self.user, self.host = _cached_user(), _cached_host()
 
         self.prompt = f"[{self.user}@{self.host}]$ "
         self.root.title(f"Эмулятор - [{self.user}@{self.host}]")
@@ -36,6 +45,12 @@ class ShellEmulatorGUI:
         root.columnconfigure(1, weight=0)
         root.rowconfigure(0, weight=1)
 
+        self._cmds = {
+            "ls": self._cmd_ls,
+            "cd": self._cmd_cd,
+            "exit": self._cmd_exit,
+        }
+
         self.entry.bind("<Return>", lambda e: self.handle_submit())
 
         self.println("Добро пожаловать в эмулятор оболочки (Вариант №18, Этап 1).")
@@ -61,6 +76,19 @@ class ShellEmulatorGUI:
             return "", [], None
         return tokens[0], tokens[1:], None
 
+    def _cmd_ls(self, args):
+        self.println(f"ls: args={args}")
+
+    def _cmd_cd(self, args):
+        if len(args) != 1:
+            self.println(f"Ошибка: команда 'cd' требует ровно 1 аргумент (путь). Получено: {len(args)}")
+        else:
+            self.println(f"cd: args={args}")
+
+    def _cmd_exit(self, args):
+        self.println("Завершение работы эмулятора.")
+        self.root.after(200, self.root.destroy)
+
     def exec(self, line: str):
         cmd, args, perr = self.parse_command_line(line)
         if perr:
@@ -68,19 +96,12 @@ class ShellEmulatorGUI:
             return
         if not cmd:
             return
+        handler = self._cmds.get(cmd)
         try:
-            if cmd == "ls":
-                self.println(f"ls: args={args}")
-            elif cmd == "cd":
-                if len(args) != 1:
-                    self.println(f"Ошибка: команда 'cd' требует ровно 1 аргумент (путь). Получено: {len(args)}")
-                else:
-                    self.println(f"cd: args={args}")
-            elif cmd == "exit":
-                self.println("Завершение работы эмулятора.")
-                self.root.after(200, self.root.destroy)
-            else:
+            if handler is None:
                 self.println(f"Ошибка: неизвестная команда '{cmd}'")
+                return
+            handler(args)
         except Exception as e:
             self.println(f"Ошибка выполнения команды '{cmd}': {e}")
 
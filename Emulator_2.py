@@ -1,6 +1,7 @@
 
 import tkinter as tk
 from tkinter import ttk
+import functools
 import getpass
 import socket
 import shlex
@@ -8,18 +9,26 @@ import argparse
 from typing import Tuple, List, Optional
 
 
+@functools.lru_cache(maxsize=1)
+def _cached_user() -> str:
+    return getpass.getuser() or "user"
+
+
+@functools.lru_cache(maxsize=1)
+def _cached_host() -> str:
+    try:
+        return socket.gethostname() or "host"
+    except Exception:
+        return "host"
+
+
 class ShellEmulatorGUI:
     def __init__(self, root: tk.Tk, vfs_path: Optional[str], startup_script: Optional[str]):
         self.root = root
         self.vfs_path = vfs_path
         self.startup_script = startup_script
 
-        user = getpass.getuser() or "user"
-        try:
-            host = socket.gethostname() or "host"
-        except Exception:
-            host = "host"
-        self.user, self.host = user, host
+        self.user, self.host = _cached_user(), _cached_host()
         self.prompt = f"[{self.user}@{self.host}]$ "
         self.root.title(f"Эмулятор - [{self.user}@{self.host}]")
 
@@ -37,6 +46,12 @@ class ShellEmulatorGUI:
         root.columnconfigure(0, weight=1)
         root.rowconfigure(0, weight=1)
 
+        self._cmds = {
+            "ls": self._cmd_ls,
+            "cd": self._cmd_cd,
+            "exit": self._cmd_exit,
+        }
+
         self.entry.bind("<Return>", lambda e: self.handle_submit())
         self.entry.focus_set()
 
@@ -68,6 +83,22 @@ class ShellEmulatorGUI:
             return "", [], None
         return tokens[0], tokens[1:], None
 
+    def _cmd_ls(self, args: List[str]) -> Tuple[bool, bool]:
+        self.println(f"ls: args={args}")
+        return True, False
+
+    def _cmd_cd(self, args: List[str]) -> Tuple[bool, bool]:
+        if len(args) != 1:
+            self.println(f"Ошибка: команда 'cd' требует ровно 1 аргумент (путь). Получено: {len(args)}")
+            return False, False
+        self.println(f"cd: args={args}")
+        return True, False
+
+    def _cmd_exit(self, args: List[str]) -> Tuple[bool, bool]:
+        self.println("Завершение работы эмулятора.")
+        self.root.after(200, self.root.destroy)
+        return True, True
+
     def exec(self, line: str) -> Tuple[bool, bool]:
         cmd, args, perr = self.parse_command_line(line)
         if perr:
@@ -76,23 +107,12 @@ class ShellEmulatorGUI:
         if not cmd:
             return True, False
 
+        handler = self._cmds.get(cmd)
         try:
-            if cmd == "ls":
-                self.println(f"ls: args={args}")
-                return True, False
-            elif cmd == "cd":
-                if len(args) != 1:
-                    self.println(f"Ошибка: команда 'cd' требует ровно 1 аргумент (путь). Получено: {len(args)}")
-                    return False, False
-                self.println(f"cd: args={args}")
-                return True, False
-            elif cmd == "exit":
-                self.println("Завершение работы эмулятора.")
-                self.root.after(200, self.root.destroy)
-                return True, True
-            else:
+            if handler is None:
                 self.println(f"Ошибка: неизвестная команда '{cmd}'")
                 return False, False
+            return handler(args)
         except Exception as e:
             self.println(f"Ошибка выполнения команды '{cmd}': {e}")
             return False, False
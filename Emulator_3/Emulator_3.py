@@ -1,115 +1,214 @@
 
-import tkinter as tk
-from tkinter import ttk
+import functools
 import getpass
+import os
 import socket
 import shlex
+import sys
 import argparse
-import hashlib
-import csv
-import base64
-from dataclasses import dataclass, field
-from typing import Dict, Optional, Tuple, List
-from pathlib import Path
+import re
+from typing import TYPE_CHECKING, Dict, Optional, Tuple, List
+
+# tkinter, csv, hashlib, base64 и pathlib импортируются там, где нужны:
+# `--help` и запуск без --vfs не платят за их загрузку.
+if TYPE_CHECKING:
+    import tkinter as tk
+
+
+SCRIPT_CHUNK = 1000  # строк стартового скрипта за один вызов из цикла Tk
+HASH_CHUNK = 64 * 1024  # размер блока при хешировании CSV VFS
+OUTPUT_MAX_LINES = 5000  # сколько последних строк вывода держит виджет
+
+# Слово без кавычек либо строка в "..." / '...'; экранирование через \ разбирает shlex.
+# Пробелы — только shlex-овские ' \t\r\n': NBSP, \v, \f и т.п. остаются частью слова.
+_TOKEN_RE = re.compile(r'''"([^"]*)"|'([^']*)'|([^ \t\r\n"'\\]+)''')
+
+# Вид узла VFS: целое сравнивается дешевле строки при каждом обходе дерева.
+VFS_DIR = 0
+VFS_FILE = 1
+_KIND = {"dir": VFS_DIR, "file": VFS_FILE}  # значение колонки type в CSV -> вид узла
+
+# Последняя разобранная VFS: (абсолютный путь, mtime_ns, размер) -> VFS.
+# Команды этого этапа VFS не изменяют, поэтому окна могут делить одно дерево.
+# Хранится не больше одной записи, чтобы старые деревья не копились в памяти.
+_VFS_CACHE: Dict[Tuple[str, int, int], "VFS"] = {}
+
+
+@functools.lru_cache(maxsize=1)
+def _cached_user() -> str:
+    return getpass.getuser() or "user"
+
+
+@functools.lru_cache(maxsize=1)
+def _cached_host() -> str:
+    try:
+        return socket.gethostname() or "host"
+    except Exception:
+        return "host"
 
 
-@dataclass
 class VFSNode:
-    kind: str
-    children: Dict[str, "VFSNode"] = field(default_factory=dict)  # for dirs
-    content: bytes = b""
+    # Без __dict__ на каждый узел: в большой VFS их тысячи.
+    __slots__ = ("kind", "children", "content")
+
+    def __init__(self, kind: int, children: Optional[Dict[str, "VFSNode"]] = None, content: bytes = b""):
+        self.kind = kind
+        self.children: Dict[str, "VFSNode"] = {} if children is None else children  # for dirs
+        self.content = content
 
     def is_dir(self) -> bool:
-        return self.kind == "dir"
+        return self.kind == VFS_DIR
 
     def is_file(self) -> bool:
-        return self.kind == "file"
+        return self.kind == VFS_FILE
 
 
 class VFS:
 
     def __init__(self):
-        self.root = VFSNode(kind="dir")
-        self._raw_bytes: Optional[bytes] = None
+        self.root = VFSNode(kind=VFS_DIR)
+        # Уже пройденные каталоги: кортеж сегментов пути -> узел.
+        self._dir_cache: Dict[Tuple[str, ...], VFSNode] = {(): self.root}
+        self._digest: Optional[str] = None
         self._name: Optional[str] = None
 
     def load_from_csv(self, path: str):
-        data = Path(path).read_bytes()
-        self._raw_bytes = data
+        import base64
+        import csv
+        import hashlib
+        from pathlib import Path
+
+        with open(path, "rb") as f:
+            if hasattr(hashlib, "file_digest"):  # Python 3.11+
+                self._digest = hashlib.file_digest(f, "sha256").hexdigest()
+            else:
+                h = hashlib.sha256()
+                while chunk := f.read(HASH_CHUNK):
+                    h.update(chunk)
+                self._digest = h.hexdigest()
         self._name = Path(path).name
-        text = data.decode("utf-8")
-        reader = csv.DictReader(text.splitlines())
-        for i, row in enumerate(reader, start=2):
-            p = (row.get("path") or "").strip()
-            t = (row.get("type") or "").strip().lower()
-            enc = (row.get("encoding") or "").strip().lower()
-            content = row.get("content") or ""
-            if not p or not t:
-                raise ValueError(f"CSV: пустой path/type (строка {i})")
-            parts = [seg for seg in p.split("/") if seg not in ("", ".")]
-            if t == "dir":
-                self._ensure_dir(parts)
-            elif t == "file":
-                if not parts:
-                    raise ValueError(f"CSV: некорректный путь к файлу (строка {i})")
-                parent = self._ensure_dir(parts[:-1])
-                filename = parts[-1]
-                if enc in ("", "utf8", "text"):
-                    data_bytes = content.encode("utf-8")
-                elif enc in ("base64", "b64", "binary"):
-                    try:
-                        data_bytes = base64.b64decode(content.encode("ascii"))
-                    except Exception as e:
-                        raise ValueError(f"CSV: не удалось декодировать base64 (строка {i}): {e}")
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                return
+            width = len(header)
+            col = {name: i for i, name in enumerate(header)}
+            ip, it = col.get("path"), col.get("type")
+            ie, ic = col.get("encoding", -1), col.get("content", -1)
+            # Одинаковое содержимое (пустые файлы, общие заголовки) кодируется один раз.
+            text_cache: Dict[str, bytes] = {}
+            b64_cache: Dict[str, bytes] = {}
+            i = 1  # номер записи для сообщений: пустые строки не считаются, как и раньше в DictReader
+            for row in reader:
+                if not row:
+                    continue
+                i += 1
+                if ip is None or it is None:
+                    raise ValueError(f"CSV: пустой path/type (строка {i})")
+                if len(row) < width:
+                    row += [""] * (width - len(row))
+                p = row[ip].strip()
+                t = row[it].strip().lower()
+                enc = row[ie].strip().lower() if ie >= 0 else ""
+                content = row[ic] if ic >= 0 else ""
+                if not p or not t:
+                    raise ValueError(f"CSV: пустой path/type (строка {i})")
+                parts = p.split("/")
+                if "" in parts or "." in parts:  # обычно путь уже нормализован
+                    parts = [seg for seg in parts if seg and seg != "."]
+                kind = _KIND.get(t)
+                if kind == VFS_DIR:
+                    self._ensure_dir(parts)
+                elif kind == VFS_FILE:
+                    if not parts:
+                        raise ValueError(f"CSV: некорректный путь к файлу (строка {i})")
+                    parent = self._ensure_dir(parts[:-1])
+                    filename = sys.intern(parts[-1])
+                    if enc in ("", "utf8", "text"):
+                        data_bytes = text_cache.get(content)
+                        if data_bytes is None:
+                            data_bytes = text_cache[content] = content.encode("utf-8")
+                    elif enc in ("base64", "b64", "binary"):
+                        data_bytes = b64_cache.get(content)
+                        if data_bytes is None:
+                            try:
+                                # Не-ASCII: прежний encode("ascii") даёт то же сообщение, что и раньше.
+                                data_bytes = base64.b64decode(content if content.isascii() else content.encode("ascii"))
+                            except Exception as e:
+                                raise ValueError(f"CSV: не удалось декодировать base64 (строка {i}): {e}")
+                            b64_cache[content] = data_bytes
+                    else:
+                        raise ValueError(f"CSV: неизвестная кодировка '{enc}' (строка {i})")
+                    old = parent.children.get(filename)
+                    if old is not None and old.is_dir():
+                        self._forget_dirs(tuple(parts))
+                    parent.children[filename] = VFSNode(kind=VFS_FILE, content=data_bytes)
                 else:
-                    raise ValueError(f"CSV: неизвестная кодировка '{enc}' (строка {i})")
-                parent.children[filename] = VFSNode(kind="file", content=data_bytes)
-            else:
-                raise ValueError(f"CSV: неизвестный type '{t}' (строка {i})")
+                    raise ValueError(f"CSV: неизвестный type '{t}' (строка {i})")
 
     def _ensure_dir(self, parts: List[str]) -> VFSNode:
-        cur = self.root
-        for name in parts:
+        key = tuple(parts)
+        cur = self._dir_cache.get(key)
+        if cur is not None:
+            return cur
+        # Идём не от корня, а от самого длинного уже известного префикса.
+        depth = len(key) - 1
+        while depth > 0 and key[:depth] not in self._dir_cache:
+            depth -= 1
+        cur = self._dir_cache[key[:depth]]
+        for k in range(depth, len(key)):
+            name = sys.intern(key[k])
             node = cur.children.get(name)
             if node is None:
-                node = VFSNode(kind="dir")
+                node = VFSNode(kind=VFS_DIR)
                 cur.children[name] = node
-            elif node.kind != "dir":
+            elif node.kind != VFS_DIR:
                 raise ValueError(f"Путь конфликтует с файлом: {'/'.join(parts)}")
             cur = node
+            self._dir_cache[key[:k + 1]] = cur
         return cur
 
+    def _forget_dirs(self, prefix: Tuple[str, ...]):
+        n = len(prefix)
+        self._dir_cache = {k: v for k, v in self._dir_cache.items() if k[:n] != prefix}
+
     @property
     def name(self) -> Optional[str]:
         return self._name
 
     def sha256(self) -> Optional[str]:
-        if self._raw_bytes is None:
-            return None
-        return hashlib.sha256(self._raw_bytes).hexdigest()
+        return self._digest
 
 class ShellEmulatorGUI:
 
-    def __init__(self, root: tk.Tk, vfs_path: Optional[str], startup_script: Optional[str]):
+    def __init__(self, root: "tk.Tk", vfs_path: Optional[str], startup_script: Optional[str]):
+        import tkinter as tk
+        from tkinter import ttk
+
         self.root = root
         self.vfs_path = vfs_path
         self.startup_script = startup_script
 
-        user = getpass.getuser() or "user"
-        try:
-            host = socket.gethostname() or "host"
-        except Exception:
-            host = "host"
-        self.user, self.host = user, host
-        self.prompt = f"[{self.user}@{self.host}]$ "
-        self.root.title(f"Эмулятор - [{self.user}@{self.host}]")
+        self.user, self.host = _cached_user(), _cached_host()
+        self._user_host = f"{self.user}@{self.host}"
+        self.prompt = f"[{self._user_host}]$ "
+        self.root.title(f"Эмулятор - [{self._user_host}]")
 
         # UI
-        self.text = tk.Text(root, wrap="word", font=("Courier New", 12), state="normal")
+        # Панель вывода только для чтения: undo не нужен, правка — лишь на время insert.
+        self.text = tk.Text(root, wrap="word", font=("Courier New", 12), state="disabled",
+                            undo=False, autoseparators=False)
         self.scroll = ttk.Scrollbar(root, command=self.text.yview)
         self.text["yscrollcommand"] = self.scroll.set
         self.entry = ttk.Entry(root, font=("Courier New", 12))
         self.btn = ttk.Button(root, text="Ввод", command=self.handle_submit)
+        # Связанные методы виджетов, вызываемые на каждую строку вывода/ввода.
+        self._insert = self.text.insert
+        self._see = self.text.see
+        self._text_configure = self.text.configure
+        self._entry_get = self.entry.get
+        self._entry_delete = self.entry.delete
 
         self.text.grid(row=0, column=0, columnspan=2, sticky="nsew")
         self.scroll.grid(row=0, column=2, sticky="ns")
@@ -119,9 +218,25 @@ class ShellEmulatorGUI:
         root.columnconfigure(0, weight=1)
         root.rowconfigure(0, weight=1)
 
+        self._unknown_fmt = "Ошибка: неизвестная команда '{}'".format
+        self._cmds = {
+            "ls": self._cmd_ls,
+            "cd": self._cmd_cd,
+            "vfs-info": self._cmd_vfs_info,
+            "exit": self._cmd_exit,
+        }
+
         self.entry.bind("<Return>", lambda e: self.handle_submit())
         self.entry.focus_set()
 
+        # Буфер вывода: пока выполняется скрипт, строки копятся здесь
+        # и попадают в виджет одним insert в конце пачки.
+        self._batch_mode = False
+        self._out_buf: List[str] = []
+        self._pending_see = False
+        self._max_lines = OUTPUT_MAX_LINES
+        self._line_count = 0
+
         self.vfs = VFS()
         self._load_vfs_if_any()
 
@@ -137,20 +252,92 @@ class ShellEmulatorGUI:
             self.root.after(100, self._run_startup_script_safe)
 
     def println(self, text: str = ""):
-        self.text.insert("end", text + "\n")
-        self.text.see("end")
+        if self._batch_mode:
+            self._out_buf.append(text + "\n")
+            return
+        self._append(text + "\n")
+
+    def _flush_out(self):
+        if not self._out_buf:
+            return
+        self._append("".join(self._out_buf))
+        self._out_buf.clear()
+
+    def _append(self, chunk: str):
+        self._text_configure(state="normal")
+        self._insert("end", chunk)
+        self._text_configure(state="disabled")
+        self._line_count += chunk.count("\n")
+        if not self._pending_see:
+            self._pending_see = True
+            self.root.after_idle(self._flush_view)
+
+    def _flush_view(self):
+        self._pending_see = False
+        # Старые строки выкидываются с начала, чтобы виджет не рос бесконечно.
+        excess = self._line_count - self._max_lines
+        if excess > 0:
+            self._text_configure(state="normal")
+            self.text.delete("1.0", f"{excess + 1}.0")
+            self._text_configure(state="disabled")
+            self._line_count = self._max_lines
+        self._see("end")
 
     def print_prompt_and_command(self, cmd: str):
-        self.println(self.prompt + cmd)
+        line = self.prompt + cmd + "\n"
+        if self._batch_mode:
+            self._out_buf.append(line)
+        else:
+            self._append(line)
 
     def parse_command_line(self, line: str) -> Tuple[str, List[str], Optional[str]]:
-        try:
-            tokens = shlex.split(line, posix=True)
-        except ValueError as e:
-            return "", [], f"Ошибка парсинга: {e}"
+        if "\\" in line:
+            try:
+                tokens = shlex.split(line, posix=True)
+            except ValueError as e:
+                return "", [], f"Ошибка парсинга: {e}"
+        else:
+            tokens = []
+            end = 0
+            for m in _TOKEN_RE.finditer(line):
+                start = m.start()
+                if start != end and not line[end:start].isspace():
+                    return "", [], "Ошибка парсинга: No closing quotation"
+                piece = m.group(m.lastindex)
+                # Части без пробела между ними — одно слово, как в shlex: a"b c" -> 'ab c'
+                if tokens and start == end:
+                    tokens[-1] += piece
+                else:
+                    tokens.append(piece)
+                end = m.end()
+            if end != len(line) and not line[end:].isspace():
+                return "", [], "Ошибка парсинга: No closing quotation"
         if not tokens:
             return "", [], None
-        return tokens[0], tokens[1:], None
+        return sys.intern(tokens[0]), tokens[1:], None
+
+    def _cmd_ls(self, args: List[str]) -> Tuple[bool, bool]:
+        self.println(f"ls: args={args}")
+        return True, False
+
+    def _cmd_cd(self, args: List[str]) -> Tuple[bool, bool]:
+        if len(args) != 1:
+            self.println(f"Ошибка: команда 'cd' требует ровно 1 аргумент (путь). Получено: {len(args)}")
+            return False, False
+        self.println(f"cd: args={args}")
+        return True, False
+
+    def _cmd_vfs_info(self, args: List[str]) -> Tuple[bool, bool]:
+        if self.vfs.name is None:
+            self.println("VFS не загружена.")
+        else:
+            self.println(f"VFS: name={self.vfs.name}, sha256={self.vfs.sha256()}")
+        return True, False
+
+    def _cmd_exit(self, args: List[str]) -> Tuple[bool, bool]:
+        self.println("Завершение работы эмулятора.")
+        self.root.after(200, self.root.destroy)
+        return True, True
 
     def exec(self, line: str) -> Tuple[bool, bool]:
         cmd, args, perr = self.parse_command_line(line)
@@ -160,29 +347,12 @@ class ShellEmulatorGUI:
         if not cmd:
             return True, False
 
+        handler = self._cmds.get(cmd)
         try:
-            if cmd == "ls":
-                self.println(f"ls: args={args}")
-                return True, False
-            elif cmd == "cd":
-                if len(args) != 1:
-                    self.println(f"Ошибка: команда 'cd' требует ровно 1 аргумент (путь). Получено: {len(args)}")
-                    return False, False
-                self.println(f"cd: args={args}")
-                return True, False
-            elif cmd == "vfs-info":
-                if self.vfs.name is None:
-                    self.println("VFS не загружена.")
-                else:
-                    self.println(f"VFS: name={self.vfs.name}, sha256={self.vfs.sha256()}")
-                return True, False
-            elif cmd == "exit":
-                self.println("Завершение работы эмулятора.")
-                self.root.after(200, self.root.destroy)
-                return True, True
-            else:
-                self.println(f"Ошибка: неизвестная команда '{cmd}'")
+            if handler is None:
+                self.println(self._unknown_fmt(cmd))
                 return False, False
+            return handler(args)
         except Exception as e:
             self.println(f"Ошибка выполнения команды '{cmd}': {e}")
             return False, False
@@ -191,7 +361,15 @@ class ShellEmulatorGUI:
         if not self.vfs_path:
             return
         try:
-            self.vfs.load_from_csv(self.vfs_path)
+            st = os.stat(self.vfs_path)
+            key = (os.path.abspath(self.vfs_path), st.st_mtime_ns, st.st_size)
+            cached = _VFS_CACHE.get(key)
+            if cached is None:
+                self.vfs.load_from_csv(self.vfs_path)
+                _VFS_CACHE.clear()
+                _VFS_CACHE[key] = self.vfs
+            else:
+                self.vfs = cached
             self.println(f"[vfs] Загружена VFS из CSV: {self.vfs.name}")
         except FileNotFoundError:
             self.println(f"[vfs] Ошибка: файл не найден: {self.vfs_path!r}")
@@ -201,8 +379,9 @@ class ShellEmulatorGUI:
     def _run_startup_script_safe(self):
         path = self.startup_script
         try:
-            text = Path(path).read_text(encoding="utf-8")
-            lines = text.splitlines()
+            # Пустые строки отбрасываются сразу; номера строк сохраняются для сообщений.
+            with open(path, "r", encoding="utf-8") as f:
+                script = [(i, line.rstrip("\n")) for i, line in enumerate(f, start=1) if line.strip()]
         except FileNotFoundError:
             self.println(f"[скрипт] Ошибка: файл не найден: {path!r}")
             return
@@ -210,41 +389,40 @@ class ShellEmulatorGUI:
             self.println(f"[скрипт] Ошибка чтения файла {path!r}: {e}")
             return
 
-        self._script_lines = [(i + 1, line) for i, line in enumerate(lines)]
-        self._script_index = 0
         self.println(f"[скрипт] Запуск скрипта: {path}")
-        self.root.after(0, self._process_next_script_line)
+        self._run_script_sync(script)
 
-    def _process_next_script_line(self):
-        if self._script_index >= len(self._script_lines):
+    def _run_script_sync(self, script: List[Tuple[int, str]], start: int = 0):
+        end = min(start + SCRIPT_CHUNK, len(script))
+        self._batch_mode = True
+        try:
+            for k in range(start, end):
+                lineno, line = script[k]
+                self.print_prompt_and_command(line)
+                ok, terminate = self.exec(line)
+
+                if terminate:
+                    return
+                if not ok:
+                    self.println(f"[скрипт] Остановлен из-за ошибки на строке {lineno}.")
+                    return
+
+            if end < len(script):
+                # Большой скрипт: отдаём управление Tk между пачками строк.
+                self.root.after_idle(self._run_script_sync, script, end)
+                return
             self.println("[скрипт] Выполнение завершено без ошибок.")
-            return
-
-        lineno, line = self._script_lines[self._script_index]
-        self._script_index += 1
-
-        if line.strip() == "":
-            self.root.after(0, self._process_next_script_line)
-            return
-
-        self.print_prompt_and_command(line)
-        ok, terminate = self.exec(line)
-
-        if terminate:
-            return
-        if not ok:
-            self.println(f"[скрипт] Остановлен из-за ошибки на строке {lineno}.")
-            return
-
-        self.root.after(0, self._process_next_script_line)
+        finally:
+            self._batch_mode = False
+            self._flush_out()
 
     def handle_submit(self):
-        text = self.entry.get().strip()
+        text = self._entry_get().strip()
         if not text:
             return
         self.print_prompt_and_command(text)
         self.exec(text)
-        self.entry.delete(0, "end")
+        self._entry_delete(0, "end")
         self.entry.focus_set()
 
 
@@ -257,6 +435,8 @@ def parse_args():
 
 def main():
     args = parse_args()
+    import tkinter as tk
+
     root = tk.Tk()
     app = ShellEmulatorGUI(root, vfs_path=args.vfs, startup_script=args.startup)
     root.geometry("900x600")
@@ -2,24 +2,47 @@
 import tkinter as tk
 from tkinter import ttk
 import getpass
+import mmap
+import os
 import socket
 import shlex
+import sys
 import argparse
 import hashlib
 import csv
-import base64
+import binascii
+import codecs
+import re
 from dataclasses import dataclass, field
-from typing import Dict, Optional, Tuple, List
+from typing import Dict, Iterable, Iterator, Optional, Tuple, List
 from pathlib import Path
 from datetime import datetime
 
 
+# Слово без кавычек либо строка в "..." / '...'; экранирование через \ разбирает shlex.
+# Пробелы — только shlex-овские ' \t\r\n': NBSP, \v, \f и т.п. остаются частью слова.
+_TOKEN_RE = re.compile(r'''"([^"]*)"|'([^']*)'|([^ \t\r\n"'\\]+)''')
 
-@dataclass
+# Сколько строк стартового скрипта выполняется за один проход цикла событий Tk.
+SCRIPT_BATCH = 100
+# Начиная с какого числа строк в одной порции вывода виджет прячется на время вставки.
+FLUSH_HIDE_LINES = 1000
+# Размер блока при проверке, что CSV целиком в UTF-8.
+UTF8_CHECK_CHUNK = 1 << 20
+
+
+@dataclass(slots=True)  # без __dict__ на узел; нужен Python 3.10+
 class VFSNode:
     kind: str
     children: Dict[str, "VFSNode"] = field(default_factory=dict)  # for dirs
     content: bytes = b""
+    # Отсортированные имена children для ls; None — пересчитать (после добавления детей).
+    _sorted_names: Optional[List[str]] = field(default=None, repr=False, compare=False)
+
+    def sorted_names(self) -> List[str]:
+        if self._sorted_names is None:
+            self._sorted_names = sorted(self.children)
+        return self._sorted_names
 
     def is_dir(self) -> bool:
         return self.kind == "dir"
@@ -32,20 +55,65 @@ class VFS:
 
     def __init__(self):
         self.root = VFSNode(kind="dir")
-        self._raw_bytes: Optional[bytes] = None
+        # Плоский индекс "/a/b/c" -> узел: абсолютный путь без '..' находится одним поиском.
+        self._abs_index: Dict[str, VFSNode] = {"/": self.root}
+        self._sha256_hex: Optional[str] = None
         self._name: Optional[str] = None
+        # Последняя цепочка каталогов из _ensure_dir: узел _walk_nodes[k] соответствует _walk_parts[:k].
+        # Соседние строки CSV обычно делят длинный префикс, и спуск начинается с его конца.
+        self._walk_parts: List[str] = []
+        self._walk_nodes: List[VFSNode] = [self.root]
 
     def load_from_csv(self, path: str):
-        data = Path(path).read_bytes()
-        self._raw_bytes = data
-        self._name = Path(path).name
-        text = data.decode("utf-8")
-        reader = csv.DictReader(text.splitlines())
-        for i, row in enumerate(reader, start=2):
-            p = (row.get("path") or "").strip()
-            t = (row.get("type") or "").strip().lower()
-            enc = (row.get("encoding") or "").strip().lower()
-            content = row.get("content") or ""
+        # Файл отображается в память: хеш и разбор читают страницы кэша ОС без копии всего CSV в кучу.
+        # Поля строк — отдельные bytes, так что после закрытия mmap в узлах ничего от него не остаётся.
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                self._sha256_hex = hashlib.sha256(b"").hexdigest()
+                self._name = Path(path).name
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                self._sha256_hex = hashlib.sha256(mm).hexdigest()
+                self._name = Path(path).name
+                self._check_utf8(mm)
+                self._load_records(self._csv_records(iter(mm.readline, b"")))
+
+    @staticmethod
+    def _check_utf8(mm: mmap.mmap):
+        """Весь файл должен быть корректным UTF-8, как при прежнем data.decode("utf-8").
+
+        Проверка идёт блоками, без строки на весь файл; при ошибке файл декодируется
+        целиком, чтобы исключение было тем же, что и раньше (с позицией от начала файла).
+        """
+        dec = codecs.getincrementaldecoder("utf-8")()
+        try:
+            for off in range(0, len(mm), UTF8_CHECK_CHUNK):
+                dec.decode(mm[off:off + UTF8_CHECK_CHUNK])
+            dec.decode(b"", final=True)
+        except UnicodeDecodeError:
+            mm[:].decode("utf-8")
+            raise
+
+    def _load_records(self, records: Iterator[List[bytes]]):
+        header = next(records, None)
+        if header is None:
+            return
+        width = len(header)
+        col = {name.strip().decode("utf-8"): i for i, name in enumerate(header)}
+        ip, it = col.get("path"), col.get("type")
+        ie, ic = col.get("encoding", -1), col.get("content", -1)
+        # Одинаковое содержимое (пустые файлы, общие заголовки) хранится одним объектом bytes.
+        pool: Dict[bytes, bytes] = {}
+        for i, row in enumerate(records, start=2):
+            if ip is None or it is None:
+                raise ValueError(f"CSV: пустой path/type (строка {i})")
+            if len(row) < width:
+                row += [b""] * (width - len(row))
+            # Декодируются только короткие служебные поля; content остаётся байтами.
+            p = row[ip].strip().decode("utf-8")
+            t = row[it].strip().decode("utf-8").lower()
+            enc = row[ie].strip().decode("utf-8").lower() if ie >= 0 else ""
+            content = row[ic] if ic >= 0 else b""
             if not p or not t:
                 raise ValueError(f"CSV: пустой path/type (строка {i})")
             parts = [seg for seg in p.split("/") if seg not in ("", ".")]
@@ -53,59 +121,166 @@ class VFS:
                 self._ensure_dir(parts)
             elif t == "file":
                 parent = self._ensure_dir(parts[:-1])
-                filename = parts[-1] if parts else None
+                filename = sys.intern(parts[-1]) if parts else None
                 if not filename:
                     raise ValueError(f"CSV: некорректный путь к файлу (строка {i})")
                 if enc in ("", "utf8", "text"):
-                    data_bytes = content.encode("utf-8")
+                    data_bytes = content
                 elif enc in ("base64", "b64", "binary"):
-                    data_bytes = base64.b64decode(content.encode("ascii"))
+                    if not content.isascii():
+                        # a2b_base64 молча пропустил бы не-ASCII байты, а прежний encode("ascii")
+                        # падал с UnicodeEncodeError — бросаем ту же ошибку.
+                        content.decode("utf-8").encode("ascii")
+                    # content уже bytes: сразу в C-декодер, без обёртки b64decode.
+                    data_bytes = binascii.a2b_base64(content)
                 else:
                     raise ValueError(f"CSV: неизвестная кодировка '{enc}' (строка {i})")
-                parent.children[filename] = VFSNode(kind="file", content=data_bytes)
+                data_bytes = pool.setdefault(data_bytes, data_bytes)
+                old = parent.children.get(filename)
+                node = parent.children[filename] = VFSNode(kind="file", content=data_bytes)
+                parent._sorted_names = None
+                key = "/" + "/".join(parts)
+                if old is not None and old.is_dir():
+                    self._forget_subtree(key)
+                    # Каталог заменён файлом: закэшированная цепочка могла проходить через него.
+                    del self._walk_parts[:], self._walk_nodes[1:]
+                self._abs_index[key] = node
             else:
                 raise ValueError(f"CSV: неизвестный type '{t}' (строка {i})")
 
+    @staticmethod
+    def _csv_records(lines: Iterable[bytes]) -> Iterator[List[bytes]]:
+        """Записи CSV из потока строк в виде списков полей (bytes), пустые строки пропускаются.
+
+        Строка без кавычек просто режется по запятым. Записи с кавычками
+        (в том числе многострочные) собираются целиком и отдаются csv.reader.
+        """
+        pending: List[bytes] = []
+        for line in lines:
+            if line.endswith(b"\n"):
+                line = line[:-1]
+            if line.endswith(b"\r"):
+                line = line[:-1]
+            if not pending:
+                if b'"' not in line:
+                    if line:
+                        yield line.split(b",")
+                    continue
+                if not VFS._quote_open(line, False):
+                    yield from VFS._csv_quoted(line)
+                    continue
+            elif not VFS._quote_open(line, True):
+                pending.append(line)
+                yield from VFS._csv_quoted(b"\n".join(pending))
+                pending = []
+                continue
+            pending.append(line)  # поле в кавычках не закрыто: запись продолжается на следующей строке
+        if pending:
+            yield from VFS._csv_quoted(b"\n".join(pending))
+
+    @staticmethod
+    def _quote_open(line: bytes, in_quote: bool) -> bool:
+        """Остаётся ли к концу строки открытым поле в кавычках (по правилам csv.reader).
+
+        Кавычка открывает поле, только если стоит в его начале; внутри поля без кавычек
+        она обычный символ. in_quote — строка продолжает уже открытое поле.
+        """
+        i, n = 0, len(line)
+        while i < n:
+            if in_quote:
+                j = line.find(b'"', i)
+                if j < 0:
+                    return True
+                if line[j + 1:j + 2] == b'"':
+                    i = j + 2  # "" — экранированная кавычка внутри поля
+                    continue
+                in_quote = False
+                i = j + 1
+            elif line[i:i + 1] == b'"':
+                in_quote = True
+                i += 1
+                continue
+            # Остаток поля до запятой: кавычки здесь уже ничего не открывают.
+            k = line.find(b",", i)
+            if k < 0:
+                return False
+            i = k + 1
+        return in_quote
+
+    @staticmethod
+    def _csv_quoted(record: bytes) -> Iterator[List[bytes]]:
+        for row in csv.reader([record.decode("utf-8")]):
+            if row:
+                yield [f.encode("utf-8") for f in row]
+
     def _ensure_dir(self, parts: List[str]) -> VFSNode:
-        cur = self.root
-        for name in parts:
+        walk_parts, walk_nodes = self._walk_parts, self._walk_nodes
+        k = 0
+        limit = min(len(parts), len(walk_parts))
+        while k < limit and parts[k] == walk_parts[k]:
+            k += 1
+        del walk_parts[k:], walk_nodes[k + 1:]
+        cur = walk_nodes[k]
+        for k in range(k, len(parts)):
+            # Ключи children интернируются: повторяющиеся имена хранятся в одном экземпляре,
+            # а поиск интернированным сегментом в resolve совпадает по идентичности.
+            name = sys.intern(parts[k])
             node = cur.children.get(name)
             if node is None:
                 node = VFSNode(kind="dir")
                 cur.children[name] = node
+                cur._sorted_names = None
+                self._abs_index["/" + "/".join(parts[:k + 1])] = node
             elif node.kind != "dir":
                 raise ValueError(f"Путь конфликтует с файлом: {'/'.join(parts)}")
+            walk_parts.append(name)
+            walk_nodes.append(node)
             cur = node
         return cur
 
+    def _forget_subtree(self, key: str):
+        prefix = key + "/"
+        self._abs_index = {k: v for k, v in self._abs_index.items() if not k.startswith(prefix)}
+
     def sha256(self) -> Optional[str]:
-        if self._raw_bytes is None:
-            return None
-        import hashlib
-        return hashlib.sha256(self._raw_bytes).hexdigest()
+        return self._sha256_hex
 
     @property
     def name(self) -> Optional[str]:
         return self._name
 
-    def resolve(self, cwd_parts: List[str], path: str) -> Tuple[List[str], Optional[VFSNode]]:
-        parts: List[str] = []
-        if path.startswith("/"):
-            parts = []
-        else:
-            parts = list(cwd_parts)
+    def resolve_from(self, base_node: VFSNode, base_parts: List[str], path: str) -> Tuple[List[str], Optional[VFSNode]]:
+        """Разрешает путь; относительный путь идёт от уже найденного узла base_node.
 
+        Обход от корня нужен только для абсолютного пути или если '..' поднялся выше base_parts.
+        """
+        if path.startswith("/"):
+            if ".." not in path:
+                canonical = path.rstrip("/") or "/"
+                node = self._abs_index.get(canonical)
+                if node is not None:
+                    return (canonical[1:].split("/") if canonical != "/" else []), node
+            base_node, base_parts = self.root, []
+        parts = list(base_parts)
+        keep = len(parts)  # сколько сегментов base_parts осталось нетронутыми
+
+        # Один проход по split: пустые сегменты и '.' отсеиваются тут же, отдельного фильтра нет.
         for seg in path.split("/"):
-            if seg in ("", "."):
+            if not seg or seg == ".":
                 continue
             if seg == "..":
                 if parts:
                     parts.pop()
+                    if len(parts) < keep:
+                        keep = len(parts)
                 continue
-            parts.append(seg)
+            parts.append(sys.intern(seg))
 
-        node = self.root
-        for seg in parts:
+        if keep == len(base_parts):
+            node, rest = base_node, parts[keep:]
+        else:
+            node, rest = self.root, parts
+        for seg in rest:
             if not node.is_dir():
                 return parts, None
             node = node.children.get(seg)
@@ -143,11 +318,25 @@ class ShellEmulatorGUI:
         root.columnconfigure(0, weight=1)
         root.rowconfigure(0, weight=1)
 
+        # Имя команды -> (обработчик, принимает ли аргументы). exit обрабатывается в exec отдельно.
+        self._dispatch = {
+            "ls": (self.cmd_ls, True),
+            "cd": (self.cmd_cd, True),
+            "date": (self.cmd_date, False),
+            "tac": (self.cmd_tac, True),
+            "vfs-info": (self.cmd_vfs_info, False),
+            "pwd": (self.cmd_pwd, False),
+        }
+
         self.entry.bind("<Return>", lambda e: self.handle_submit())
         self.entry.focus_set()
 
+        self._out_buf: List[str] = []
+        self._flush_pending = False
+
         self.vfs = VFS()
         self.cwd_parts: List[str] = []
+        self.cwd_node: VFSNode = self.vfs.root  # узел текущего каталога, обновляется в cmd_cd
         self._load_vfs_if_any()
 
         self.println("Добро пожаловать в эмулятор оболочки (Вариант №18, Этап 4).")
@@ -159,8 +348,26 @@ class ShellEmulatorGUI:
             self.root.after(100, self._run_startup_script_safe)
 
     def println(self, text: str = ""):
-        self.text.insert("end", text + "\n")
-        self.text.see("end")
+        # Строки копятся и уходят в виджет одним insert, когда Tk освободится.
+        self._out_buf.append(text + "\n")
+        if not self._flush_pending:
+            self._flush_pending = True
+            self.root.after_idle(self._flush_out)
+
+    def _flush_out(self):
+        self._flush_pending = False
+        # Прокручиваем вниз, только если пользователь и так был внизу: ручная прокрутка не сбивается.
+        at_bottom = self.text.yview()[1] >= 0.999
+        big = len(self._out_buf) > FLUSH_HIDE_LINES
+        if big:
+            # На время крупной вставки виджет снимается с сетки, чтобы Tk не пересчитывал раскладку.
+            self.text.grid_remove()
+        self.text.insert("end", "".join(self._out_buf))
+        if big:
+            self.text.grid()
+        if at_bottom:
+            self.text.see("end")
+        self._out_buf.clear()
 
     def print_prompt_and_command(self, cmd: str):
         self.println(self.prompt + cmd)
@@ -169,10 +376,27 @@ class ShellEmulatorGUI:
         return "/" + "/".join(self.cwd_parts)
 
     def parse_command_line(self, line: str) -> Tuple[str, List[str], Optional[str]]:
-        try:
-            tokens = shlex.split(line, posix=True)
-        except ValueError as e:
-            return "", [], f"Ошибка парсинга: {e}"
+        if "\\" in line:
+            try:
+                tokens = shlex.split(line, posix=True)
+            except ValueError as e:
+                return "", [], f"Ошибка парсинга: {e}"
+        else:
+            tokens = []
+            end = 0
+            for m in _TOKEN_RE.finditer(line):
+                start = m.start()
+                if start != end and not line[end:start].isspace():
+                    return "", [], "Ошибка парсинга: No closing quotation"
+                piece = m.group(m.lastindex)
+                # Части без пробела между ними — одно слово, как в shlex: a"b c" -> 'ab c'
+                if tokens and start == end:
+                    tokens[-1] += piece
+                else:
+                    tokens.append(piece)
+                end = m.end()
+            if end != len(line) and not line[end:].isspace():
+                return "", [], "Ошибка парсинга: No closing quotation"
         if not tokens:
             return "", [], None
         return tokens[0], tokens[1:], None
@@ -180,14 +404,14 @@ class ShellEmulatorGUI:
     # ---- Commands ----
     def cmd_ls(self, args: List[str]) -> bool:
         target = args[0] if args else "."
-        parts, node = self.vfs.resolve(self.cwd_parts, target)
+        parts, node = self.vfs.resolve_from(self.cwd_node, self.cwd_parts, target)
         if node is None:
             self.println(f"ls: не удалось открыть '{target}': Нет такого файла или каталога")
             return False
         if node.is_file():
             self.println("/".join(parts[-1:]))
             return True
-        names = sorted(node.children.keys())
+        names = node.sorted_names()
         if names:
             self.println("  ".join(names))
         return True
@@ -197,11 +421,12 @@ class ShellEmulatorGUI:
             self.println("Ошибка: команда 'cd' требует ровно 1 аргумент (путь).")
             return False
         target = args[0]
-        parts, node = self.vfs.resolve(self.cwd_parts, target)
+        parts, node = self.vfs.resolve_from(self.cwd_node, self.cwd_parts, target)
         if node is None or not node.is_dir():
             self.println(f"cd: не удалось перейти в '{target}': Нет такого каталога")
             return False
         self.cwd_parts = parts
+        self.cwd_node = node
         return True
 
     def cmd_date(self) -> bool:
@@ -214,7 +439,7 @@ class ShellEmulatorGUI:
             self.println("tac: требуется ровно 1 аргумент: путь к файлу")
             return False
         target = args[0]
-        parts, node = self.vfs.resolve(self.cwd_parts, target)
+        parts, node = self.vfs.resolve_from(self.cwd_node, self.cwd_parts, target)
         if node is None:
             self.println(f"tac: '{target}': Нет такого файла")
             return False
@@ -222,12 +447,34 @@ class ShellEmulatorGUI:
             self.println(f"tac: '{target}': это каталог")
             return False
         try:
-            text = node.content.decode("utf-8")
+            lines = self._reversed_lines(node.content)
         except UnicodeDecodeError:
             self.println(f"tac: '{target}': невозможно декодировать как UTF-8")
             return False
-        for line in reversed(text.splitlines()):
-            self.println(line)
+        if lines:
+            self.println("\n".join(lines))
+        return True
+
+    @staticmethod
+    def _reversed_lines(data: bytes) -> List[str]:
+        """Строки файла с конца, как reversed(text.splitlines()); декодируется каждая строка отдельно.
+
+        Одиночный \r тоже разделитель (старые Mac); прочие разделители Unicode добирает str.splitlines().
+        """
+        lines: List[str] = []
+        for raw in reversed(data.splitlines(keepends=True)):
+            lines.extend(reversed(raw.decode("utf-8").splitlines()))
+        return lines
+
+    def cmd_vfs_info(self) -> bool:
+        if self.vfs.name is None:
+            self.println("VFS не загружена.")
+        else:
+            self.println(f"VFS: name={self.vfs.name}, sha256={self.vfs.sha256()}")
+        return True
+
+    def cmd_pwd(self) -> bool:
+        self.println(self.cwd_str())
         return True
 
     def exec(self, line: str) -> Tuple[bool, bool]:
@@ -238,29 +485,17 @@ class ShellEmulatorGUI:
         if not cmd:
             return True, False
         try:
-            if cmd == "ls":
-                ok = self.cmd_ls(args); return ok, False
-            elif cmd == "cd":
-                ok = self.cmd_cd(args); return ok, False
-            elif cmd == "date":
-                ok = self.cmd_date(); return ok, False
-            elif cmd == "tac":
-                ok = self.cmd_tac(args); return ok, False
-            elif cmd == "vfs-info":
-                if self.vfs.name is None:
-                    self.println("VFS не загружена.")
-                else:
-                    self.println(f"VFS: name={self.vfs.name}, sha256={self.vfs.sha256()}")
-                return True, False
-            elif cmd == "pwd":
-                self.println(self.cwd_str()); return True, False
-            elif cmd == "exit":
+            if cmd == "exit":
                 self.println("Завершение работы эмулятора.")
                 self.root.after(200, self.root.destroy)
                 return True, True
-            else:
+            entry = self._dispatch.get(cmd)
+            if entry is None:
                 self.println(f"Ошибка: неизвестная команда '{cmd}'")
                 return False, False
+            handler, takes_args = entry
+            ok = handler(args) if takes_args else handler()
+            return ok, False
         except Exception as e:
             self.println(f"Ошибка выполнения команды '{cmd}': {e}")
             return False, False
@@ -294,26 +529,28 @@ class ShellEmulatorGUI:
         self.root.after(0, self._process_next_script_line)
 
     def _process_next_script_line(self):
-        if self._script_index >= len(self._script_lines):
-            self.println("[скрипт] Выполнение завершено без ошибок.")
-            return
+        # Строки идут плотным циклом; в цикл событий Tk возвращаемся раз в SCRIPT_BATCH строк, чтобы окно успевало перерисоваться.
+        lines = self._script_lines
+        end = min(self._script_index + SCRIPT_BATCH, len(lines))
+        while self._script_index < end:
+            lineno, line = lines[self._script_index]
+            self._script_index += 1
+
+            if line.strip() == "":
+                continue
 
-        lineno, line = self._script_lines[self._script_index]
-        self._script_index += 1
+            self.print_prompt_and_command(line)
+            ok, terminate = self.exec(line)
 
-        if line.strip() == "":
-            self.root.after(0, self._process_next_script_line)
-            return
+            if terminate:
+                return
+            if not ok:
+                self.println(f"[скрипт] Остановлен из-за ошибки на строке {lineno}.")
+                return
 
-        self.print_prompt_and_command(line)
-        ok, terminate = self.exec(line)
-
-        if terminate:
-            return
-        if not ok:
-            self.println(f"[скрипт] Остановлен из-за ошибки на строке {lineno}.")
+        if self._script_index >= len(lines):
+            self.println("[скрипт] Выполнение завершено без ошибок.")
             return
-
         self.root.after(0, self._process_next_script_line)
 
     def handle_submit(self):
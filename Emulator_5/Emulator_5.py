@@ -1,7 +1,10 @@
 import tkinter as tk
 from tkinter import ttk
+import functools
 import getpass
+import io
 import socket
+import sys
 import shlex
 import argparse
 import hashlib
@@ -9,18 +12,56 @@ import csv
 import base64
 import re
 from dataclasses import dataclass, field
-from typing import Dict, Optional, Tuple, List
+from typing import Dict, Iterable, Iterator, Optional, Tuple, List
 from pathlib import Path
 from datetime import datetime
 
 
-@dataclass
+# Слово shlex в строке без кавычек и обратной косой черты: всё, кроме его пробельных символов.
+_WORD_RE = re.compile(r"[^ \t\r\n]+")
+
+# Сколько строк стартового скрипта выполняется за один проход цикла событий Tk.
+SCRIPT_BATCH = 100
+
+# Допустимые буквы прав в символьном режиме chmod.
+_RWX = frozenset("rwxX")
+
+# Буква опции ls -> имя флага.
+_LS_FLAGS = {"l": "long", "a": "all"}
+
+
+def _split_path(p: str) -> List[str]:
+    """Сегменты пути без пустых и '.'; '..' остаются как есть."""
+    return [seg for seg in p.split("/") if seg and seg != "."]
+
+
+@functools.lru_cache(maxsize=1)
+def _cached_user() -> str:
+    return getpass.getuser() or "user"
+
+
+@functools.lru_cache(maxsize=1)
+def _cached_host() -> str:
+    try:
+        return socket.gethostname() or "host"
+    except Exception:
+        return "host"
+
+
+@dataclass(slots=True)  # без __dict__ на узел; нужен Python 3.10+
 class VFSNode:
     kind: str                     # 'dir' | 'file'
     children: Dict[str, "VFSNode"] = field(default_factory=dict)  # для dir
     content: bytes = b""          # для file
     mode: int = 0o000             # права доступа (восьмеричные)
-    mtime: datetime = field(default_factory=lambda: datetime.now().astimezone())
+    mtime: Optional[datetime] = None  # None, пока узел не тронут командой touch
+    # Отсортированные имена children для ls; None — пересчитать (после добавления детей).
+    _sorted_names: Optional[List[str]] = field(default=None, repr=False, compare=False)
+
+    def sorted_names(self) -> List[str]:
+        if self._sorted_names is None:
+            self._sorted_names = sorted(self.children)
+        return self._sorted_names
 
     def is_dir(self) -> bool:
         return self.kind == "dir"
@@ -29,33 +70,75 @@ class VFSNode:
         return self.kind == "file"
 
 
+class _HashingReader(io.RawIOBase):
+    """Сырой поток-обёртка: всё, что прочитано из файла, заодно передаётся в хеш."""
+
+    def __init__(self, raw, hasher):
+        self._raw = raw
+        self._hasher = hasher
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = self._raw.readinto(b)
+        if n:
+            self._hasher.update(memoryview(b)[:n])
+        return n
+
+
 class VFS:
 
     def __init__(self):
         self.root = VFSNode(kind="dir", mode=0o755)
-        self._raw_bytes: Optional[bytes] = None
+        self._sha256_hex: Optional[str] = None
         self._name: Optional[str] = None
 
     def load_from_csv(self, path: str):
-        data = Path(path).read_bytes()
-        self._raw_bytes = data
-        self._name = Path(path).name
-        text = data.decode("utf-8")
-        reader = csv.DictReader(text.splitlines())
-        for i, row in enumerate(reader, start=2):
-            p = (row.get("path") or "").strip()
-            t = (row.get("type") or "").strip().lower()
-            enc = (row.get("encoding") or "").strip().lower()
-            content = row.get("content") or ""
+        # Сам CSV в памяти не держим: файл читается один раз, и каждый прочитанный блок
+        # попадает и в хеш, и в csv.reader.
+        h = hashlib.sha256()
+        with open(path, "rb", buffering=0) as raw:
+            buf = io.BufferedReader(_HashingReader(raw, h), buffer_size=1 << 20)
+            f = io.TextIOWrapper(buf, encoding="utf-8", newline="")
+            try:
+                self._load_rows(csv.reader(f))
+            finally:
+                # Остаток файла дочитывается, чтобы хеш покрыл его целиком и при ошибке в какой-то строке.
+                buf.read()
+                self._sha256_hex = h.hexdigest()
+                # Имя — только когда файл открылся, как и раньше: иначе vfs-info считал бы VFS загруженной.
+                self._name = Path(path).name
+
+    def _load_rows(self, reader: Iterator[List[str]]):
+        header = next(reader, None)
+        if header is None:
+            return
+        # Индексы колонок определяются один раз по заголовку; -1 — колонки нет.
+        idx = {name: i for i, name in enumerate(header)}
+        ip, it = idx.get("path", -1), idx.get("type", -1)
+        ie, ic = idx.get("encoding", -1), idx.get("content", -1)
+        width = len(header)
+        i = 1
+        for row in reader:
+            if not row:
+                continue
+            i += 1
+            if len(row) < width:
+                row += [""] * (width - len(row))
+            p = row[ip].strip() if ip >= 0 else ""
+            t = row[it].strip().lower() if it >= 0 else ""
+            enc = row[ie].strip().lower() if ie >= 0 else ""
+            content = row[ic] if ic >= 0 else ""
             if not p or not t:
                 raise ValueError(f"CSV: пустой path/type (строка {i})")
-            parts = [seg for seg in p.split("/") if seg not in ("", ".")]
+            parts = _split_path(p)
             if t == "dir":
                 node = self._ensure_dir(parts)
                 node.mode = node.mode or 0o755
             elif t == "file":
                 parent = self._ensure_dir(parts[:-1])
-                filename = parts[-1] if parts else None
+                filename = sys.intern(parts[-1]) if parts else None
                 if not filename:
                     raise ValueError(f"CSV: некорректный путь к файлу (строка {i})")
                 if enc in ("", "utf8", "text"):
@@ -65,25 +148,28 @@ class VFS:
                 else:
                     raise ValueError(f"CSV: неизвестная кодировка '{enc}' (строка {i})")
                 parent.children[filename] = VFSNode(kind="file", content=data_bytes, mode=0o644)
+                parent._sorted_names = None
             else:
                 raise ValueError(f"CSV: неизвестный type '{t}' (строка {i})")
 
     def _ensure_dir(self, parts: List[str]) -> VFSNode:
         cur = self.root
         for name in parts:
+            # Ключи children интернируются: повторяющиеся имена хранятся в одном экземпляре,
+            # а поиск интернированным сегментом в resolve совпадает по идентичности.
+            name = sys.intern(name)
             node = cur.children.get(name)
             if node is None:
                 node = VFSNode(kind="dir", mode=0o755)
                 cur.children[name] = node
+                cur._sorted_names = None
             elif node.kind != "dir":
                 raise ValueError(f"Путь конфликтует с файлом: {'/'.join(parts)}")
             cur = node
         return cur
 
     def sha256(self) -> Optional[str]:
-        if self._raw_bytes is None:
-            return None
-        return hashlib.sha256(self._raw_bytes).hexdigest()
+        return self._sha256_hex
 
     @property
     def name(self) -> Optional[str]:
@@ -91,19 +177,31 @@ class VFS:
 
     # ---------- Разрешение путей ----------
 
-    def resolve(self, cwd_parts: List[str], path: str) -> Tuple[List[str], Optional[VFSNode]]:
-        parts: List[str] = [] if path.startswith("/") else list(cwd_parts)
+    def resolve_from(self, base_node: VFSNode, base_parts: List[str], path: str) -> Tuple[List[str], Optional[VFSNode]]:
+        """Разрешает путь; относительный путь идёт от уже найденного узла base_node.
+
+        Обход от корня нужен только для абсолютного пути или если '..' поднялся выше base_parts.
+        """
+        if path.startswith("/"):
+            base_node, base_parts = self.root, []
+        parts = list(base_parts)
+        keep = len(parts)  # сколько сегментов base_parts осталось нетронутыми
         for seg in path.split("/"):
-            if seg in ("", "."):
+            if not seg or seg == ".":
                 continue
             if seg == "..":
                 if parts:
                     parts.pop()
+                    if len(parts) < keep:
+                        keep = len(parts)
                 continue
-            parts.append(seg)
+            parts.append(sys.intern(seg))
 
-        node = self.root
-        for seg in parts:
+        if keep == len(base_parts):
+            node, rest = base_node, parts[keep:]
+        else:
+            node, rest = self.root, parts
+        for seg in rest:
             if not node.is_dir():
                 return parts, None
             node = node.children.get(seg)
@@ -111,42 +209,35 @@ class VFS:
                 return parts, None
         return parts, node
 
-    def resolve_parent(self, cwd_parts: List[str], path: str) -> Tuple[List[str], Optional[VFSNode], Optional[str]]:
-        parts: List[str] = [] if path.startswith("/") else list(cwd_parts)
-        segs = [s for s in path.split("/") if s not in ("", ".")]
+    def resolve_parent_from(self, base_node: VFSNode, base_parts: List[str], path: str) -> Tuple[List[str], Optional[VFSNode], Optional[str], Optional[VFSNode]]:
+        # Кроме родителя возвращает и сам узел basename (или None), чтобы не проходить путь второй раз через resolve_from().
+        segs = _split_path(path)
         if not segs:
-            return parts, None, None
-        basename = segs[-1]
-        for seg in segs[:-1]:
-            if seg == "..":
-                if parts:
-                    parts.pop()
-            else:
-                parts.append(seg)
-        node = self.root
-        for seg in parts:
-            if not node.is_dir():
-                return parts, None, basename
-            node = node.children.get(seg)
-            if node is None:
-                return parts, None, basename
-        return parts, node, basename
+            return ([] if path.startswith("/") else list(base_parts)), None, None, None
+        basename = sys.intern(segs[-1])
+        head = "/".join(segs[:-1])
+        if path.startswith("/"):
+            head = "/" + head
+        parts, node = self.resolve_from(base_node, base_parts, head)
+        if node is None or not node.is_dir():
+            return parts, node, basename, None
+        if basename == "..":
+            return parts, node, basename, self.resolve_from(node, parts, "..")[1]
+        return parts, node, basename, node.children.get(basename)
 
 
 # ---------------- GUI Shell Emulator ----------------
 
 class ShellEmulatorGUI:
+    # Готовые строки режимов 0000..0777 для ls -l: без форматирования на каждую запись.
+    _OCT = [f"{m:04o}" for m in range(0o1000)]
+
     def __init__(self, root: tk.Tk, vfs_path: Optional[str], startup_script: Optional[str]):
         self.root = root
         self.vfs_path = vfs_path
         self.startup_script = startup_script
 
-        user = getpass.getuser() or "user"
-        try:
-            host = socket.gethostname() or "host"
-        except Exception:
-            host = "host"
-        self.user, self.host = user, host
+        self.user, self.host = _cached_user(), _cached_host()
         self.prompt = f"[{self.user}@{self.host}]$ "
         self.root.title(f"Эмулятор - [{self.user}@{self.host}]")
 
@@ -168,8 +259,14 @@ class ShellEmulatorGUI:
         self.entry.bind("<Return>", lambda e: self.handle_submit())
         self.entry.focus_set()
 
+        # Буфер вывода: пока выполняется пачка строк скрипта, вывод копится здесь
+        # и попадает в виджет одним insert в конце пачки.
+        self._batch_mode = False
+        self._out_buf: List[str] = []
+
         self.vfs = VFS()
         self.cwd_parts: List[str] = []
+        self.cwd_node: VFSNode = self.vfs.root  # узел текущего каталога, обновляется в cmd_cd
         self._load_vfs_if_any()
 
         self.println("Добро пожаловать в эмулятор оболочки (Вариант №18, Этап 5).")
@@ -181,9 +278,25 @@ class ShellEmulatorGUI:
 
 
     def println(self, text: str = ""):
+        if self._batch_mode:
+            self._out_buf.append(text + "\n")
+            return
         self.text.insert("end", text + "\n")
         self.text.see("end")
 
+    def _flush_out(self):
+        if not self._out_buf:
+            return
+        self.text.insert("end", "".join(self._out_buf))
+        self.text.see("end")
+        self._out_buf.clear()
+
+    def println_many(self, lines: Iterable[str]):
+        # Несколько строк одним insert: один вызов Tcl и одна прокрутка вместо N.
+        lines = list(lines)
+        if lines:
+            self.println("\n".join(lines))
+
     def print_prompt_and_command(self, cmd: str):
         self.println(self.prompt + cmd)
 
@@ -191,40 +304,43 @@ class ShellEmulatorGUI:
         return "/" + "/".join(self.cwd_parts)
 
     def parse_command_line(self, line: str) -> Tuple[str, List[str], Optional[str]]:
-        try:
-            tokens = shlex.split(line, posix=True)
-        except ValueError as e:
-            return "", [], f"Ошибка парсинга: {e}"
+        if '"' in line or "'" in line or "\\" in line:
+            try:
+                tokens = shlex.split(line, posix=True)
+            except ValueError as e:
+                return "", [], f"Ошибка парсинга: {e}"
+        else:
+            # Без кавычек и обратной косой черты shlex сводится к разбиению по его пробельным
+            # символам ' \t\r\n'; str.split() не годится — он режет ещё и по NBSP, \v, \f и т.п.
+            tokens = _WORD_RE.findall(line)
         if not tokens:
             return "", [], None
         return tokens[0], tokens[1:], None
 
     @staticmethod
     def _fmt_mode(node: VFSNode) -> str:
-        kind_char = "d" if node.is_dir() else "-"
-        return f"{kind_char}{node.mode:04o}"
+        return ("d" if node.kind == "dir" else "-") + ShellEmulatorGUI._OCT[node.mode & 0o777]
 
 
     def cmd_ls(self, args: List[str]) -> bool:
-        long = False
-        all_ = False
+        opts = set()
         i = 0
-        while i < len(args) and args[i].startswith("-") and args[i] != "-":
-            flags = args[i][1:]
-            for ch in flags:
-                if ch == "l":
-                    long = True
-                elif ch == "a":
-                    all_ = True
-                else:
+        n_args = len(args)
+        while i < n_args and len(args[i]) > 1 and args[i][0] == "-":
+            for ch in args[i][1:]:
+                flag = _LS_FLAGS.get(ch)
+                if flag is None:
                     self.println(f"ls: неизвестная опция '-{ch}'")
                     return False
+                opts.add(flag)
             i += 1
+        long = "long" in opts
+        all_ = "all" in opts
 
         target = args[i] if i < len(args) else "."
 
         # Резолвим цель
-        parts, node = self.vfs.resolve(self.cwd_parts, target)
+        parts, node = self.vfs.resolve_from(self.cwd_node, self.cwd_parts, target)
         if node is None:
             self.println(f"ls: не удалось открыть '{target}': Нет такого файла или каталога")
             return False
@@ -241,7 +357,7 @@ class ShellEmulatorGUI:
             print_entry(name, node)
             return True
 
-        names = sorted(node.children.keys())
+        names = node.sorted_names()
 
         if not all_:
             names = [n for n in names if not n.startswith(".")]
@@ -265,8 +381,12 @@ class ShellEmulatorGUI:
             entries.append((name, node.children[name]))
 
         if long:
-            for name, child in entries:
-                self.println(f"{self._fmt_mode(child)} {name}")
+            # Весь листинг собирается одной строкой и уходит в виджет одним insert.
+            oct_ = self._OCT
+            self.println_many([
+                ("d" if child.kind == "dir" else "-") + oct_[child.mode & 0o777] + " " + name
+                for name, child in entries
+            ])
         else:
             if entries:
                 self.println("  ".join(name for name, _ in entries))
@@ -277,11 +397,12 @@ class ShellEmulatorGUI:
             self.println("Ошибка: команда 'cd' требует ровно 1 аргумент (путь).")
             return False
         target = args[0]
-        parts, node = self.vfs.resolve(self.cwd_parts, target)
+        parts, node = self.vfs.resolve_from(self.cwd_node, self.cwd_parts, target)
         if node is None or not node.is_dir():
             self.println(f"cd: не удалось перейти в '{target}': Нет такого каталога")
             return False
         self.cwd_parts = parts
+        self.cwd_node = node
         return True
 
     def cmd_date(self) -> bool:
@@ -294,7 +415,7 @@ class ShellEmulatorGUI:
             self.println("tac: требуется ровно 1 аргумент: путь к файлу")
             return False
         target = args[0]
-        parts, node = self.vfs.resolve(self.cwd_parts, target)
+        parts, node = self.vfs.resolve_from(self.cwd_node, self.cwd_parts, target)
         if node is None:
             self.println(f"tac: '{target}': Нет такого файла")
             return False
@@ -302,25 +423,31 @@ class ShellEmulatorGUI:
             self.println(f"tac: '{target}': это каталог")
             return False
 
+        # Правило разбиения на строки:
+        #  * обычно строки делятся настоящими \n, \r и \r\n (bytes.splitlines); они режутся и
+        #    переставляются как bytes, а в str декодируется один раз уже готовый результат;
+        #  * если в файле есть литерал "\n" (два символа) и при этом настоящих переводов нет вовсе
+        #    либо каждая строка, кроме последней, кончается литералом "\n" (так записаны многострочные
+        #    поля в vfs_deep.csv: "alpha\n<LF>beta\n"), настоящие переводы отбрасываются, а
+        #    разделителями считаются литералы "\r\n", "\n" и "\r".
+        # Ограничение: если литерал "\n" в конце каждой строки — это данные, а не записанный перевод,
+        # файл всё равно будет разбит по литералам, в том числе по тем, что стоят внутри строк.
+        data = node.content
+        lines = data.splitlines()
         try:
-            text = node.content.decode("utf-8")
+            escaped = b"\\n" in data and (
+                len(lines) <= 1 and b"\n" not in data
+                or len(lines) > 1 and all(line.endswith(b"\\n") for line in lines[:-1])
+            )
+            if escaped:
+                text = b"".join(lines).decode("utf-8")
+                text = text.replace("\\r\\n", "\n").replace("\\n", "\n").replace("\\r", "\n")
+                self.println_many(reversed(text.splitlines()))
+            elif lines:
+                self.println(b"\n".join(reversed(lines)).decode("utf-8"))
         except UnicodeDecodeError:
             self.println(f"tac: '{target}': невозможно декодировать как UTF-8")
             return False
-
-        chunks = re.findall(r'.*?(?:\r\n|\r|\n)|.+\Z', text, flags=re.DOTALL)
-
-        if len(chunks) <= 1 and "\\n" in text and "\n" not in text:
-            text = text.replace("\\r\\n", "\n").replace("\\n", "\n").replace("\\r", "\n")
-            chunks = re.findall(r'.*?(?:\r\n|\r|\n)|.+\Z', text, flags=re.DOTALL)
-
-        for chunk in reversed(chunks):
-            if chunk.endswith("\r\n"):
-                self.println(chunk[:-2])
-            elif chunk.endswith("\n") or chunk.endswith("\r"):
-                self.println(chunk[:-1])
-            else:
-                self.println(chunk)
         return True
 
     def cmd_touch(self, args: List[str]) -> bool:
@@ -328,26 +455,29 @@ class ShellEmulatorGUI:
             self.println("touch: требуется ровно 1 аргумент: путь к файлу")
             return False
         target = args[0]
-        parent_parts, parent_node, basename = self.vfs.resolve_parent(self.cwd_parts, target)
+        # Один проход по пути: resolve_parent_from сразу отдаёт и родителя, и существующий узел.
+        _, parent_node, basename, node = self.vfs.resolve_parent_from(self.cwd_node, self.cwd_parts, target)
         if parent_node is None or not parent_node.is_dir():
             self.println(f"touch: не удалось создать '{target}': Родительский каталог не найден")
             return False
-        _, node = self.vfs.resolve(self.cwd_parts, target)
         now = datetime.now().astimezone()
-        if node:
+        if node is not None:
             node.mtime = now
             self.println(f"touch: обновлён mtime '{target}'")
             return True
         parent_node.children[basename] = VFSNode(kind="file", content=b"", mode=0o644, mtime=now)
+        parent_node._sorted_names = None
         self.println(f"touch: создан пустой файл '{target}'")
         return True
 
-    def _chmod_apply_symbolic(self, cur_mode: int, clause: str, is_dir: bool) -> int:
-        i = 0
-        classes = ""
-        while i < len(clause) and clause[i] in "ugoa":
-            classes += clause[i]
-            i += 1
+    @staticmethod
+    def _chmod_compile(clause: str) -> Tuple[str, int, int, int]:
+        """Разбирает символьную клаузу один раз: (op, маска классов, биты rwx, биты X).
+
+        От узла зависит только X (каталог или уже есть x), поэтому его биты хранятся отдельно.
+        """
+        i = len(clause) - len(clause.lstrip("ugoa"))  # длина префикса классов
+        classes = clause[:i]
         if not classes:
             classes = "a"
         if i >= len(clause) or clause[i] not in "+-=":
@@ -357,25 +487,9 @@ class ShellEmulatorGUI:
         if i >= len(clause):
             raise ValueError(f"неверный синтаксис chmod: '{clause}'")
         perms = clause[i:]
-        if not all(c in "rwxX" for c in perms):
+        if not _RWX.issuperset(perms):
             raise ValueError(f"неверные права в chmod: '{perms}'")
 
-        def bits_for(perms_local: str, cls_char: str) -> int:
-            shift = {"u": 6, "g": 3, "o": 0}[cls_char]
-            mask = 0
-            for ch in perms_local:
-                if ch == "r":
-                    mask |= (0o4 << shift)
-                elif ch == "w":
-                    mask |= (0o2 << shift)
-                elif ch == "x":
-                    mask |= (0o1 << shift)
-                elif ch == "X":
-                    exec_any = (cur_mode & 0o111) != 0
-                    if is_dir or exec_any:
-                        mask |= (0o1 << shift)
-            return mask
-
         class_mask_all = 0
         for cls in classes:
             class_mask_all |= {
@@ -385,38 +499,43 @@ class ShellEmulatorGUI:
                 "a": 0o777,
             }[cls]
 
-        new_mode = cur_mode
-
-        if op == "=":
-            set_mask = 0
-            for cls in ("u", "g", "o"):
-                if ("a" in classes) or (cls in classes):
-                    set_mask |= bits_for(perms, cls)
-            new_mode = (new_mode & ~class_mask_all) | (set_mask & class_mask_all)
-        elif op == "+":
-            add_mask = 0
-            for cls in ("u", "g", "o"):
-                if ("a" in classes) or (cls in classes):
-                    add_mask |= bits_for(perms, cls)
-            new_mode |= add_mask
-        elif op == "-":
-            sub_mask = 0
-            for cls in ("u", "g", "o"):
-                if ("a" in classes) or (cls in classes):
-                    sub_mask |= bits_for(perms, cls)
-            new_mode &= ~sub_mask
-        else:
-            raise ValueError(f"неизвестная операция chmod: '{op}'")
+        # Биты прав для одного класса (сдвиг 0); размножаются на выбранные классы маской.
+        one = 0
+        if "r" in perms:
+            one |= 0o4
+        if "w" in perms:
+            one |= 0o2
+        if "x" in perms:
+            one |= 0o1
+        spread = 0o111 & class_mask_all  # младший бит каждого выбранного класса
+        bits = one * spread
+        x_bits = spread if "X" in perms else 0
+        return op, class_mask_all, bits, x_bits
 
-        new_mode &= 0o777
-        return new_mode
+    @staticmethod
+    def _chmod_apply(cur_mode: int, compiled: List[Tuple[str, int, int, int]], is_dir: bool) -> int:
+        for op, class_mask_all, bits, x_bits in compiled:
+            mask = bits
+            if x_bits and (is_dir or cur_mode & 0o111):
+                mask |= x_bits
+            if op == "=":
+                cur_mode = (cur_mode & ~class_mask_all) | mask
+            elif op == "+":
+                cur_mode |= mask
+            else:
+                cur_mode &= ~mask
+        return cur_mode & 0o777
 
     def _chmod_walk(self, node: VFSNode, recursive: bool):
         """Итерация по узлу и (опц.) всем дочерним для -R."""
-        yield node
-        if recursive and node.is_dir():
-            for _, child in node.children.items():
-                yield from self._chmod_walk(child, True)
+        # Явный стек вместо рекурсии: один кадр генератора на всё поддерево и нет упора в recursion limit.
+        # Дети кладутся в обратном порядке, чтобы обход остался прежним (прямой, в порядке children).
+        stack = [node]
+        while stack:
+            n = stack.pop()
+            yield n
+            if recursive and n.is_dir():
+                stack.extend(reversed(n.children.values()))
 
 
     def cmd_chmod(self, args: List[str]) -> bool:
@@ -436,16 +555,23 @@ class ShellEmulatorGUI:
         mode_spec = args[i]
         target = args[i + 1]
 
-        parts, node = self.vfs.resolve(self.cwd_parts, target)
+        parts, node = self.vfs.resolve_from(self.cwd_node, self.cwd_parts, target)
         if node is None:
             self.println(f"chmod: не удалось применить к '{target}': Нет такого файла или каталога")
             return False
 
-        is_numeric = (len(mode_spec) in (3, 4)) and all(c in "01234567" for c in mode_spec)
+        # Числовой режим: 3-4 восьмеричные цифры. Проверку делает int() в C;
+        # isascii/isdigit отсекают знаки, пробелы, '0o' и '_', которые int() тоже принял бы.
+        mode_val: Optional[int] = None
+        if len(mode_spec) in (3, 4) and mode_spec.isascii() and mode_spec.isdigit():
+            try:
+                mode_val = int(mode_spec, 8)
+            except ValueError:
+                pass  # есть 8 или 9 — разбираем как символьный режим, как и раньше
 
         try:
-            if is_numeric:
-                mode_val = int(mode_spec, 8) & 0o777
+            if mode_val is not None:
+                mode_val &= 0o777
                 for n in self._chmod_walk(node, recursive):
                     n.mode = mode_val
                 self.println(f"chmod: установлен {mode_val:04o} для '{target}'" + (" (рекурсивно)" if recursive else ""))
@@ -455,11 +581,9 @@ class ShellEmulatorGUI:
                 if not clauses:
                     self.println(f"chmod: неверный режим '{mode_spec}'")
                     return False
+                compiled = [self._chmod_compile(clause) for clause in clauses]
                 for n in self._chmod_walk(node, recursive):
-                    cur = n.mode
-                    for clause in clauses:
-                        cur = self._chmod_apply_symbolic(cur, clause, is_dir=n.is_dir())
-                    n.mode = cur & 0o777
+                    n.mode = self._chmod_apply(n.mode, compiled, n.is_dir())
                 self.println(f"chmod: применён символьный режим '{mode_spec}' для '{target}'" + (" (рекурсивно)" if recursive else ""))
                 return True
         except ValueError as e:
@@ -534,28 +658,35 @@ class ShellEmulatorGUI:
         self.root.after(0, self._process_next_script_line)
 
     def _process_next_script_line(self):
-        if self._script_index >= len(self._script_lines):
-            self.println("[скрипт] Выполнение завершено без ошибок.")
-            return
-
-        lineno, line = self._script_lines[self._script_index]
-        self._script_index += 1
-
-        stripped = line.strip()
-        if stripped == "" or stripped.startswith("#"):
+        # Строки идут плотным циклом; в цикл событий Tk возвращаемся раз в SCRIPT_BATCH строк, чтобы окно успевало перерисоваться.
+        lines = self._script_lines
+        end = min(self._script_index + SCRIPT_BATCH, len(lines))
+        self._batch_mode = True
+        try:
+            while self._script_index < end:
+                lineno, line = lines[self._script_index]
+                self._script_index += 1
+
+                stripped = line.strip()
+                if stripped == "" or stripped.startswith("#"):
+                    continue
+
+                self.print_prompt_and_command(line)
+                ok, terminate = self.exec(line)
+
+                if terminate:
+                    return
+                if not ok:
+                    self.println(f"[скрипт] Остановлен из-за ошибки на строке {lineno}.")
+                    return
+
+            if self._script_index >= len(lines):
+                self.println("[скрипт] Выполнение завершено без ошибок.")
+                return
             self.root.after(0, self._process_next_script_line)
-            return
-
-        self.print_prompt_and_command(line)
-        ok, terminate = self.exec(line)
-
-        if terminate:
-            return
-        if not ok:
-            self.println(f"[скрипт] Остановлен из-за ошибки на строке {lineno}.")
-            return
-
-        self.root.after(0, self._process_next_script_line)
+        finally:
+            self._batch_mode = False
+            self._flush_out()
 
     def handle_submit(self):
         text = self.entry.get().strip()